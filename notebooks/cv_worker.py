@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+CV Extraction Worker
+Long-running alternative to calling `extract_cv_data.py` from cron. The daemon
+imports Docling once, keeps its converter worker processes and the OpenAI client
+alive, and processes jobs sent over a Unix socket; the cron entrypoint only walks
+the CV folder and sends the PDF paths, so it starts in well under a second.
+
+    python notebooks/cv_worker.py serve      # daemon (systemd, launchd, tmux...)
+    python notebooks/cv_worker.py submit     # cron entrypoint
+
+A job is one line of JSON, {"paths": [...], "sizes": [...]}; the daemon answers {"status": N}
+once the job is written, and `submit` exits with that status.
+"""
+
+import os
+import sys
+import json
+import socket
+import logging
+import argparse
+import socketserver
+import multiprocessing
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# === SETUP ABSOLUTE PATHS ===
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+LOG_DIR = PROJECT_ROOT / "logs"
+
+# Add project root to path for imports
+sys.path.insert(0, str(PROJECT_ROOT))
+
+logger = logging.getLogger(__name__)
+
+# === IMPORTS ===
+# Only light imports here: `submit` must not pay for Docling. `serve` imports the pipeline.
+from dotenv import load_dotenv
+
+from src.cv_folder import iter_pdfs, load_settings
+
+DEFAULT_SOCKET_PATH = "/tmp/cv_worker.sock"
+
+
+# === DAEMON ===
+class JobHandler(socketserver.StreamRequestHandler):
+    """Run one job per connection and reply with its exit status."""
+
+    def handle(self):
+        try:
+            job = json.loads(self.rfile.readline())
+            file_list = tuple(zip(job['paths'], job['sizes'], strict=True))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Invalid job: {e}")
+            self.reply(2)
+            return
+
+        logger.info("=" * 60)
+        logger.info(f"Received job with {len(file_list)} PDF files")
+
+        # process_files() exits on unrecoverable errors; that ends the job, not the daemon
+        try:
+            self.server.run_job(file_list)
+            status = 0
+        except SystemExit as e:
+            status = e.code or 0
+        except Exception as e:
+            logger.exception(f"Job failed: {e}")
+            status = 1
+
+        logger.info(f"Job finished with status {status}")
+        self.reply(status)
+
+    def reply(self, status):
+        self.wfile.write((json.dumps({'status': status}) + '\n').encode())
+
+
+class WorkerServer(socketserver.UnixStreamServer):
+    """Unix socket server that serves jobs one at a time (they share the hash cache and workbook)."""
+
+    def __init__(self, socket_path, run_job):
+        self.run_job = run_job
+        super().__init__(socket_path, JobHandler)
+
+
+def pipeline_preloaded():
+    """Run in a Docling worker: whether it inherited the pipeline from the forkserver preload."""
+    import extract_cv_data
+
+    return extract_cv_data.IMPORT_PID != os.getpid()
+
+
+def pool_is_broken(executor):
+    """Whether a worker died (segfault, OOM) and broke the pool, so every later task would fail."""
+    try:
+        executor.submit(int).result()
+    except BrokenProcessPool:
+        return True
+    return False
+
+
+def serve(socket_path, output):
+    """Load the pipeline once and process jobs until interrupted."""
+    # Docling converter workers fork from a server process that has already imported the
+    # pipeline (Docling, torch), instead of each importing it from scratch. The forkserver
+    # does not get this process's sys.path (before Python 3.12) and ignores preload import
+    # errors, so the pipeline's folder goes on its PYTHONPATH.
+    os.environ['PYTHONPATH'] = os.pathsep.join(filter(None, [str(SCRIPT_DIR), os.getenv('PYTHONPATH')]))
+    multiprocessing.set_start_method("forkserver", force=True)
+    multiprocessing.set_forkserver_preload(["extract_cv_data"])
+
+    import extract_cv_data as pipeline
+    from openai import AsyncOpenAI, OpenAI
+
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        logger.error("OPENAI_API_KEY not found in environment variables")
+        sys.exit(1)
+
+    client = OpenAI(api_key=api_key)
+    settings = load_settings()
+
+    logger.info(f"Output: {output} ({settings.excel_path if output == 'excel' else settings.runs_dir})")
+
+    def start_pool():
+        # Worker processes, and the converter each builds, live until the pool is replaced
+        return ProcessPoolExecutor(max_workers=settings.docling_workers, initializer=pipeline.init_converter)
+
+    executor = start_pool()
+    if not executor.submit(pipeline_preloaded).result():
+        logger.warning("Docling workers did not inherit the preloaded pipeline; each imports it from scratch")
+
+    def run_job(file_list):
+        nonlocal executor
+        # The async client's connection pool is bound to the event loop of one
+        # asyncio.run() call, so each job gets its own (construction is cheap)
+        aclient = AsyncOpenAI(api_key=api_key, max_retries=0)
+        try:
+            pipeline.process_files(
+                file_list, settings.excel_path, settings.runs_dir, aclient, client, executor,
+                output=output, max_concurrent=settings.max_concurrent
+            )
+        finally:
+            # The files that failed with the pool are not recorded, so the next job retries them
+            if pool_is_broken(executor):
+                logger.warning("A Docling worker died and broke the pool; starting a new one")
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = start_pool()
+
+    # A socket left behind by a previous daemon would make bind() fail
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    try:
+        with WorkerServer(socket_path, run_job) as server:
+            logger.info(f"Listening on {socket_path}")
+            server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        executor.shutdown()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+# === CRON ENTRYPOINT ===
+def submit(socket_path):
+    """Send every PDF under CV_ROOT_DIR to the daemon and wait for the job to finish."""
+    root_dir = load_settings().root_dir
+
+    if not os.path.exists(root_dir):
+        logger.error(f"Root directory does not exist: {root_dir}")
+        sys.exit(1)
+
+    file_list = tuple(iter_pdfs(root_dir))
+    logger.info(f"Found {len(file_list)} PDF files")
+
+    if len(file_list) == 0:
+        logger.warning("No PDF files found in root directory")
+        sys.exit(0)
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+            job = {'paths': [path for path, _ in file_list], 'sizes': [size for _, size in file_list]}
+            sock.sendall((json.dumps(job) + '\n').encode())
+            reply = json.loads(sock.makefile().readline())
+    except (OSError, ValueError) as e:
+        logger.error(f"Cannot reach CV worker at {socket_path} - is it running? ({e})")
+        sys.exit(1)
+
+    logger.info(f"Job finished with status {reply['status']}")
+    sys.exit(reply['status'])
+
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Warm CV extraction worker and its cron entrypoint.")
+    parser.add_argument('command', choices=('serve', 'submit'))
+    parser.add_argument(
+        '--socket',
+        help="Unix socket path (default: CV_WORKER_SOCKET or /tmp/cv_worker.sock)"
+    )
+    parser.add_argument(
+        '--output',
+        choices=('excel', 'parquet'),
+        default='excel',
+        help="serve only: where the daemon writes extracted data, as in extract_cv_data.py"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # === LOGGING SETUP ===
+    LOG_DIR.mkdir(exist_ok=True)
+
+    log_filename = LOG_DIR / f"cv_worker_{datetime.now().strftime('%Y%m%d')}.log"
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_filename),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+    # === LOAD ENVIRONMENT ===
+    env_path = PROJECT_ROOT / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+    else:
+        logger.warning(f".env file not found at: {env_path}")
+
+    socket_path = args.socket or os.getenv('CV_WORKER_SOCKET', DEFAULT_SOCKET_PATH)
+
+    if args.command == 'serve':
+        serve(socket_path, args.output)
+    else:
+        submit(socket_path)
+
+
+if __name__ == "__main__":
+    main()
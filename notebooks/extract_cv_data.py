@@ -9,88 +9,104 @@ consistent behavior regardless of working directory.
 """
 
 import os
+import re
 import sys
 import json
+import time
 import hashlib
 import logging
+import argparse
+from functools import lru_cache
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
 # === SETUP ABSOLUTE PATHS ===
 # Get the directory where this script is located
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = SCRIPT_DIR.parent
-
-# Change working directory to script location for consistency
-os.chdir(SCRIPT_DIR)
+LOG_DIR = PROJECT_ROOT / "logs"
 
 # Add project root to path for imports
 sys.path.insert(0, str(PROJECT_ROOT))
 
-# === LOGGING SETUP ===
-LOG_DIR = PROJECT_ROOT / "logs"
-LOG_DIR.mkdir(exist_ok=True)
-
-log_filename = LOG_DIR / f"extract_cv_{datetime.now().strftime('%Y%m%d')}.log"
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_filename),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 logger = logging.getLogger(__name__)
 
-logger.info("=" * 60)
-logger.info("Starting CV extraction pipeline")
-logger.info(f"Script directory: {SCRIPT_DIR}")
-logger.info(f"Project root: {PROJECT_ROOT}")
-
-# === LOAD ENVIRONMENT ===
-from dotenv import load_dotenv
-
-# Load .env from project root (absolute path)
-env_path = PROJECT_ROOT / ".env"
-if env_path.exists():
-    load_dotenv(env_path)
-    logger.info(f"Loaded environment from: {env_path}")
-else:
-    logger.warning(f".env file not found at: {env_path}")
-
-# Verify API key is available
-api_key = os.getenv('OPENAI_API_KEY')
-if not api_key:
-    logger.error("OPENAI_API_KEY not found in environment variables")
-    sys.exit(1)
+# Process that imported this module; cv_worker.py checks it to tell whether its Docling
+# workers inherited the module from the forkserver (preloaded) or imported it themselves
+IMPORT_PID = os.getpid()
 
 # === IMPORTS ===
+import asyncio
 import pandas as pd
-from openai import OpenAI, beta
+import tiktoken
+from blake3 import blake3
+from dotenv import load_dotenv
+from openpyxl import load_workbook
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, OpenAI, RateLimitError
+from tenacity import (
+    before_sleep_log,
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
 from tqdm import tqdm
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 
 from src import config
+from src.cv_folder import iter_pdfs, load_settings
+from src.cv_storage import (
+    CANDIDATOS_COLUMNS,
+    CERTIFICACIONES_COLUMNS,
+    EDUCACION_COLUMNS,
+    EXPERIENCIA_COLUMNS,
+    HABILIDADES_COLUMNS,
+    append_to_workbook,
+    max_candidato_id,
+    pending_runs,
+    read_runs,
+    read_workbook_stats,
+    write_run,
+)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=api_key)
-
-from docling.document_converter import DocumentConverter
+from docling.backend.pypdfium2_backend import PyPdfiumDocumentBackend
+from docling.datamodel.base_models import ConversionStatus, InputFormat
+from docling.datamodel.pipeline_options import PdfPipelineOptions, TableFormerMode
+from docling.document_converter import DocumentConverter, PdfFormatOption
 
 # === HASH CACHE CONFIGURATION ===
 # Use absolute path for hash file (in notebooks directory)
 HASHES_FILE = SCRIPT_DIR / ".hashes.txt"
-logger.info(f"Hash cache file: {HASHES_FILE}")
+
+# New entries are BLAKE3 hashes tagged with this prefix; untagged entries are legacy SHA-256
+HASH_PREFIX = "blake3:"
+
+# A submitted Batch API job not yet written to the output, so an interrupted run can resume it
+BATCH_FILE = SCRIPT_DIR / ".batch.json"
+
+# 1 MiB reads amortize per-call overhead and match OS readahead
+HASH_CHUNK_SIZE = 1 << 20
 
 
 def calculate_file_hash(file_path):
-    """Generate a SHA-256 hash of the entire file contents (binary)."""
+    """Generate a BLAKE3 hash of the entire file contents (binary), tagged with HASH_PREFIX."""
+    hash_blake3 = blake3()
+
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hash_blake3.update(chunk)
+
+    return HASH_PREFIX + hash_blake3.hexdigest()
+
+
+def calculate_legacy_file_hash(file_path):
+    """Generate the SHA-256 hash recorded in the hash file before the switch to BLAKE3."""
     hash_sha256 = hashlib.sha256()
 
     with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
             hash_sha256.update(chunk)
 
     return hash_sha256.hexdigest()
@@ -105,27 +121,43 @@ def load_existing_hashes():
         return set(line.strip() for line in f if line.strip())
 
 
-def save_hash(hash_value):
-    """Save a new hash to the file."""
-    with open(HASHES_FILE, "a") as f:
-        f.write(hash_value + "\n")
+def save_hash(hash_value, hashes_file):
+    """Append a new hash to the (already open) hash file."""
+    hashes_file.write(hash_value + "\n")
 
 
-def process_pdf(file_path, force=False):
-    """Check if a PDF has already been processed, if not (or if forced), process and save the hash."""
-    file_hash = calculate_file_hash(file_path)
-    existing_hashes = load_existing_hashes()
+def process_pdf(file_path, file_hash, existing_hashes, hashes_file, legacy_hashes=frozenset(), legacy_hash=None,
+                force=False):
+    """Check if a PDF has already been processed; if not (or if forced), mark it for processing.
 
+    `file_hash` is the precomputed calculate_file_hash() of the file, `existing_hashes`
+    the in-memory set loaded once by load_existing_hashes() and `hashes_file` the hash
+    file opened for appending. New files are only added to `existing_hashes`, so copies
+    later in the run are skipped; their hash is saved once their rows are written.
+    `legacy_hashes` holds the SHA-256 entries from before the switch to BLAKE3 and
+    `legacy_hash` the precomputed calculate_legacy_file_hash() of the file (None when not
+    needed: the file has a BLAKE3 entry, or there are no legacy entries).
+    Returns True when the file should be processed, False otherwise.
+    """
     if not force and file_hash in existing_hashes:
         return False
 
+    # Files recorded under their legacy SHA-256 hash are re-recorded with the BLAKE3
+    # hash, so the slower fallback runs at most once per file
+    if not force and legacy_hash in legacy_hashes:
+        existing_hashes.add(file_hash)
+        save_hash(file_hash, hashes_file)
+        return False
+
     logger.info(f"Processing new file: {file_path}")
-    save_hash(file_hash)
+    existing_hashes.add(file_hash)
     return True
 
 
 # === PYDANTIC MODELS ===
 class Educacion(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     institucion: str
     titulo: str
     fecha_inicio: Optional[str]
@@ -134,6 +166,8 @@ class Educacion(BaseModel):
 
 
 class Experiencia(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     empresa: str
     ubicacion: Optional[str]
     puesto: str
@@ -143,16 +177,22 @@ class Experiencia(BaseModel):
 
 
 class Habilidad(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     nombre: str
     nivel: Optional[str]
 
 
 class Idioma(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     idioma: str
     nivel: Optional[str]
 
 
 class Curriculum(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     nombre_completo: str
     correo: str
     telefono: Optional[str]
@@ -165,314 +205,761 @@ class Curriculum(BaseModel):
     referencias: Optional[List[str]]
 
 
-# === CONFIGURATION ===
-# Allow override via environment variable, with fallback to default
-DEFAULT_ROOT_DIR = os.path.join(
-    os.path.expanduser('~'),
-    'Library', 'CloudStorage', 'OneDrive-ESPARTINAS.A',
-    'DocumentacionEspartina', 'INNOVACION',
-    'Desarrollos propios', 'Base Datos CV Capital Humano'
-)
-root_dir = os.getenv('CV_ROOT_DIR', DEFAULT_ROOT_DIR)
-output_name = os.getenv('CV_OUTPUT_NAME', 'base_cv_capital_humano.xlsx')
+# Strict structured-output format, built once instead of per request by the parse() helper
+CURRICULUM_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "Curriculum",
+        "schema": Curriculum.model_json_schema(),
+        "strict": True,
+    },
+}
+
+
+# === DOCLING CONVERSION ===
+# Per-process converter, created once by init_converter in each pool worker
+CONVERTER = None
+
+# Files per convert_all() call when everything is converted up front (batch mode)
+CONVERT_CHUNK_SIZE = 8
 
-logger.info(f"Root directory: {root_dir}")
-logger.info(f"Output file: {output_name}")
 
-# Validate root directory exists
-if not os.path.exists(root_dir):
-    logger.error(f"Root directory does not exist: {root_dir}")
-    logger.error("Set CV_ROOT_DIR environment variable to override")
-    sys.exit(1)
+def init_converter():
+    """Process pool initializer: load Docling models once per worker process.
 
-# === DISCOVER PDF FILES ===
-file_list = []
+    CVs are text-native PDFs, so the faster pypdfium backend is used with fast table
+    structure mode and OCR off (set CV_DOCLING_OCR=1 to enable it for scanned CVs).
+    """
+    global CONVERTER
 
-for root, dirs, files in os.walk(root_dir):
-    for file in files:
-        if file.lower().endswith('.pdf'):
-            file_path = os.path.join(root, file)
-            file_list.append(file_path)
+    pipeline_options = PdfPipelineOptions(
+        do_ocr=os.getenv('CV_DOCLING_OCR') == '1',
+        do_table_structure=True
+    )
+    pipeline_options.table_structure_options.mode = TableFormerMode.FAST
 
-file_list = tuple(file_list)
-logger.info(f"Found {len(file_list)} PDF files")
+    CONVERTER = DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(
+                pipeline_options=pipeline_options,
+                backend=PyPdfiumDocumentBackend
+            )
+        }
+    )
 
-if len(file_list) == 0:
-    logger.warning("No PDF files found in root directory")
-    sys.exit(0)
 
-# === LOAD EXISTING EXCEL DATA ===
-query = "Eres un prolijo y laborioso data entry del sector de recursos humanos. Tu tarea es extraer muy detalladamente toda la información relevante de los curriculum vitae recibidos en formato pdf y pasarla prolijamente a una tabla excel con el formato dado."
+def convert_to_md(file_path):
+    """Convert a PDF to markdown using this worker's DocumentConverter."""
+    result = CONVERTER.convert(file_path)
+    return result.document.export_to_markdown()
 
-excel_path = os.path.join(root_dir, output_name)
-expected_sheets = ['Candidatos', 'Experiencia', 'Educacion', 'Habilidades', 'Certificaciones']
 
-# Check if Excel file exists
-if not os.path.exists(excel_path):
-    logger.error(f"Excel file not found: {excel_path}")
-    logger.error("Create the Excel file with required sheets first")
-    sys.exit(1)
+def convert_many_to_md(file_paths):
+    """Convert several PDFs through one streaming convert_all() call on this worker's converter.
 
-try:
-    all_sheets = pd.read_excel(excel_path, sheet_name=None)
-    loaded_dfs = {}
+    Returns one entry per path, in order: the markdown, or a RuntimeError describing the failure.
+    """
+    markdowns = []
 
-    for sheet in expected_sheets:
-        if sheet in all_sheets:
-            loaded_dfs[sheet] = all_sheets[sheet]
+    for result in CONVERTER.convert_all(file_paths, raises_on_error=False):
+        if result.status in (ConversionStatus.SUCCESS, ConversionStatus.PARTIAL_SUCCESS):
+            markdowns.append(result.document.export_to_markdown())
         else:
-            logger.warning(f'Sheet "{sheet}" is not present in the file.')
+            errors = "; ".join(error.error_message for error in result.errors)
+            markdowns.append(RuntimeError(f"Conversion {result.status.value}: {errors}"))
 
-    candidatos_df = loaded_dfs.get('Candidatos')
+    return markdowns
 
-    if candidatos_df is None or candidatos_df.empty:
-        logger.error("Candidatos sheet is empty or missing")
-        sys.exit(1)
 
-    logger.info(f"Loaded Excel file with {len(candidatos_df)} existing candidates")
+# === OPENAI EXTRACTION ===
+QUERY = "Eres un prolijo y laborioso data entry del sector de recursos humanos. Tu tarea es extraer muy detalladamente toda la información relevante de los curriculum vitae recibidos en formato pdf y pasarla prolijamente a una tabla excel con el formato dado."
 
-except Exception as e:
-    logger.error(f"Error reading Excel file: {e}")
-    sys.exit(1)
+MODEL = "gpt-4o-mini-2024-07-18"
 
-# === PROCESS PDFs ===
-processed = []
-id_cv = candidatos_df.candidato_id.max() + 1
-excluded_extensions = ('.png', '.xlsx', '.jpeg', '.jpg', '.gif')
+# CV content sits in the first pages; longer exports are cut to this many prompt tokens
+MAX_INPUT_TOKENS = 8000
+# A Curriculum JSON rarely exceeds this; replies cut short are reported as errors
+MAX_OUTPUT_TOKENS = 4000
 
-# Initialize lists for each DataFrame
-candidatos_data = []
-experiencia_data = []
-educacion_data = []
-habilidades_data = []
-certificaciones_data = []
+BATCH_POLL_SECONDS = 60
 
-# Count files to process
-files_to_process = 0
-files_skipped = 0
-files_errored = 0
 
-for file_path in tqdm(file_list, desc="Processing CVs"):
-    if file_path.lower().endswith(excluded_extensions):
-        continue
+@lru_cache(maxsize=None)
+def get_encoding():
+    """Tokenizer for MODEL, loaded on first use."""
+    return tiktoken.encoding_for_model(MODEL)
 
-    if not process_pdf(file_path=file_path, force=False):
-        files_skipped += 1
-        continue
 
-    files_to_process += 1
+def truncate_markdown(result_text):
+    """Cut the markdown to at most MAX_INPUT_TOKENS tokens."""
+    encoding = get_encoding()
+    tokens = encoding.encode(result_text, disallowed_special=())
 
-    # Convert PDF to Markdown
-    try:
-        source = file_path
-        converter = DocumentConverter()
-        result = converter.convert(source)
-        result_text = result.document.export_to_markdown()
-    except Exception as e:
-        logger.error(f'Docling error for {file_path}: {e}')
-        files_errored += 1
-        continue
+    if len(tokens) <= MAX_INPUT_TOKENS:
+        return result_text
+
+    return encoding.decode(tokens[:MAX_INPUT_TOKENS])
 
-    # Extract structured data via OpenAI
+
+def build_request(file_path, result_text):
+    """Chat completion parameters for extracting a CV from its markdown."""
+    result_text = truncate_markdown(result_text)
+
+    return {
+        "model": MODEL,
+        "messages": [
+            {
+                "role": "user",
+                "content": f"Los datos del archivo {file_path} están en formato markdown:\n{result_text}\n\nPregunta: {QUERY}"
+            }
+        ],
+        "temperature": 0,
+        "max_tokens": MAX_OUTPUT_TOKENS,
+        "top_p": 1,
+        "response_format": CURRICULUM_RESPONSE_FORMAT,
+    }
+
+
+# Transient errors worth retrying: 429 rate limits, 5xx responses and timeouts/connection drops
+RETRYABLE_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
+
+
+retry_transient = retry(
+    retry=retry_if_exception_type(RETRYABLE_ERRORS),
+    wait=wait_random_exponential(min=1, max=60),
+    stop=stop_after_attempt(5),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True,
+)
+
+
+@retry_transient
+async def extract_curriculum(aclient, file_path, result_text):
+    """Request structured CV data from OpenAI, retrying transient errors with backoff."""
+    response = await aclient.chat.completions.create(**build_request(file_path, result_text))
+
+    choice = response.choices[0]
+    message = choice.message
+    if message.refusal:
+        raise ValueError(f"Model refused to extract the CV: {message.refusal}")
+    if choice.finish_reason == "length":
+        raise ValueError(f"Response exceeded {MAX_OUTPUT_TOKENS} tokens")
+
+    return Curriculum.model_validate_json(message.content)
+
+
+async def run_pipeline(aclient, executor, to_convert, max_concurrent):
+    """Convert and extract (file_path, file_hash) entries as overlapping stages.
+
+    Docling conversions run in the process pool and each markdown is put on an
+    asyncio.Queue as soon as it is ready; `max_concurrent` consumers drain the
+    queue into OpenAI requests, so parsing and network latency overlap.
+
+    Returns one result per `to_convert` entry, in the same order: the extracted
+    Curriculum, or the exception that stopped that file.
+    """
+    loop = asyncio.get_running_loop()
+    md_queue = asyncio.Queue(maxsize=2 * max_concurrent)
+    results = [None] * len(to_convert)
+    pbar = tqdm(total=len(to_convert), desc="Processing CVs")
+
+    async def convert(index, file_path):
+        try:
+            result_text = await loop.run_in_executor(executor, convert_to_md, file_path)
+        except Exception as e:
+            logger.error(f'Docling error for {file_path}: {e}')
+            results[index] = e
+            pbar.update(1)
+            return
+        await md_queue.put((index, file_path, result_text))
+
+    async def produce():
+        await asyncio.gather(*(convert(index, file_path) for index, (file_path, _) in enumerate(to_convert)))
+        # One sentinel per consumer signals there is nothing left to extract
+        for _ in range(max_concurrent):
+            await md_queue.put(None)
+
+    async def consume():
+        while (item := await md_queue.get()) is not None:
+            index, file_path, result_text = item
+            try:
+                results[index] = await extract_curriculum(aclient, file_path, result_text)
+            except Exception as e:
+                logger.error(f'OpenAI API error for {file_path}: {e}')
+                results[index] = e
+            pbar.update(1)
+
+    with pbar:
+        await asyncio.gather(produce(), *(consume() for _ in range(max_concurrent)))
+
+    return results
+
+
+def load_batch_state():
+    """The batch an earlier run submitted but did not finish writing, or None.
+
+    A dict with the batch id and the custom_ids (file hashes) it was submitted with.
+    """
     try:
-        response = beta.chat.completions.parse(
-            model="gpt-4o-mini-2024-07-18",
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"Los datos del archivo {file_path} están en formato markdown:\n{result_text}\n\nPregunta: {query}"
-                }
-            ],
-            temperature=0,
-            max_tokens=15000,
-            response_format=Curriculum,
-            top_p=1
+        with open(BATCH_FILE) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not (isinstance(state, dict) and isinstance(state.get('batch_id'), str)
+            and isinstance(state.get('custom_ids'), list)):
+        return None
+    return state
+
+
+def save_batch_state(batch_id, custom_ids):
+    """Persist a submitted batch (atomically) so an interrupted run can resume it."""
+    tmp_path = f"{BATCH_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({'batch_id': batch_id, 'custom_ids': custom_ids}, f)
+    os.replace(tmp_path, BATCH_FILE)
+
+
+def clear_batch_state():
+    """Forget the saved batch once its results are written (or it ended without them)."""
+    if BATCH_FILE.exists():
+        BATCH_FILE.unlink()
+
+
+def submit_batch(client, pending):
+    """Submit pending (file_path, file_hash, markdown) entries as one OpenAI Batch API job.
+
+    Requests are keyed by custom_id (the file hash). The batch is saved to BATCH_FILE
+    before returning its id, so it is never paid for twice.
+    """
+    lines = []
+    for file_path, file_hash, result_text in pending:
+        lines.append(json.dumps({
+            "custom_id": file_hash,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": build_request(file_path, result_text),
+        }, ensure_ascii=False))
+
+    batch_input = client.files.create(
+        file=("batch_input.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=batch_input.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    save_batch_state(batch.id, [file_hash for _, file_hash, _ in pending])
+    logger.info(f"Submitted batch {batch.id} with {len(lines)} requests")
+
+    return batch.id
+
+
+@retry_transient
+def retrieve_batch(client, batch_id):
+    """Fetch a batch's current status, retrying transient errors with backoff."""
+    return client.batches.retrieve(batch_id)
+
+
+@retry_transient
+def download_batch_output(client, file_id):
+    """Fetch a finished batch's output JSONL, retrying transient errors with backoff."""
+    return client.files.content(file_id).text
+
+
+def run_batch(client, batch_id, submitted):
+    """Wait for a submitted batch and extract the results of its (file_path, file_hash) entries.
+
+    Blocks until the batch finishes (up to its 24h completion window). Results are
+    matched back to files by custom_id (the file hash) and returned in the same
+    order as `submitted`: the extracted Curriculum, or the exception for that file.
+    """
+    batch = retrieve_batch(client, batch_id)
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(BATCH_POLL_SECONDS)
+        batch = retrieve_batch(client, batch_id)
+        counts = batch.request_counts
+        logger.info(f"Batch {batch.id} status: {batch.status} ({counts.completed}/{counts.total} completed)")
+
+    outputs = {}
+    if batch.output_file_id:
+        for line in download_batch_output(client, batch.output_file_id).splitlines():
+            if line.strip():
+                item = json.loads(line)
+                outputs[item["custom_id"]] = item
+
+    results = []
+    for file_path, file_hash in submitted:
+        item = outputs.get(file_hash)
+        if item is None:
+            error = RuntimeError(f"No batch output (batch status: {batch.status})")
+        elif item["error"] or item["response"]["status_code"] != 200:
+            error = RuntimeError(f"Batch request failed: {item['error'] or item['response']['body']}")
+        else:
+            content = item["response"]["body"]["choices"][0]["message"]["content"]
+            try:
+                results.append(Curriculum.model_validate_json(content))
+                continue
+            except ValueError as e:
+                error = e
+
+        logger.error(f'OpenAI API error for {file_path}: {error}')
+        results.append(error)
+
+    return results
+
+
+# === DATA TRANSFORMATION ===
+# First four-digit year in a free-form date string
+YEAR_RE = re.compile(r'(\d{4})')
+
+
+def append_row(columns, **values):
+    """Append one row to a dict of column lists.
+
+    Every value is evaluated before the call, so a failing row never leaves the
+    columns with different lengths.
+    """
+    for column, value in values.items():
+        columns[column].append(value)
+
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Extract structured data from PDF CVs.")
+    parser.add_argument(
+        '--mode',
+        choices=('sync', 'batch'),
+        default='sync',
+        help="'sync' calls the API per file (incremental runs); 'batch' submits one OpenAI Batch job (large backfills)"
+    )
+    parser.add_argument(
+        '--output',
+        choices=('excel', 'parquet'),
+        default='excel',
+        help="'excel' appends to the workbook; 'parquet' writes a run under CV_RUNS_DIR for rebuild_xlsx.py to merge"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Change working directory to script location for consistency
+    os.chdir(SCRIPT_DIR)
+
+    # === LOGGING SETUP ===
+    LOG_DIR.mkdir(exist_ok=True)
+
+    log_filename = LOG_DIR / f"extract_cv_{datetime.now().strftime('%Y%m%d')}.log"
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_filename),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    logger.info("=" * 60)
+    logger.info("Starting CV extraction pipeline")
+    logger.info(f"Script directory: {SCRIPT_DIR}")
+    logger.info(f"Project root: {PROJECT_ROOT}")
+    logger.info(f"Extraction mode: {args.mode}")
+    logger.info(f"Output: {args.output}")
+    logger.info(f"Hash cache file: {HASHES_FILE}")
+
+    # === LOAD ENVIRONMENT ===
+    # Load .env from project root (absolute path)
+    env_path = PROJECT_ROOT / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        logger.info(f"Loaded environment from: {env_path}")
+    else:
+        logger.warning(f".env file not found at: {env_path}")
+
+    # Verify API key is available
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        logger.error("OPENAI_API_KEY not found in environment variables")
+        sys.exit(1)
+
+    # Initialize OpenAI clients (async retries are handled by tenacity in extract_curriculum)
+    aclient = AsyncOpenAI(api_key=api_key, max_retries=0)
+    client = OpenAI(api_key=api_key)
+
+    # === CONFIGURATION ===
+    settings = load_settings()
+
+    logger.info(f"Root directory: {settings.root_dir}")
+    logger.info(f"Output file: {settings.excel_path}")
+
+    # Validate root directory exists
+    if not os.path.exists(settings.root_dir):
+        logger.error(f"Root directory does not exist: {settings.root_dir}")
+        logger.error("Set CV_ROOT_DIR environment variable to override")
+        sys.exit(1)
+
+    # === DISCOVER PDF FILES ===
+    file_list = tuple(iter_pdfs(settings.root_dir))
+    logger.info(f"Found {len(file_list)} PDF files")
+
+    if len(file_list) == 0:
+        logger.warning("No PDF files found in root directory")
+        sys.exit(0)
+
+    # Worker processes start on first use, so runs with nothing new never load Docling
+    with ProcessPoolExecutor(max_workers=settings.docling_workers, initializer=init_converter) as executor:
+        process_files(
+            file_list, settings.excel_path, settings.runs_dir, aclient, client, executor,
+            mode=args.mode, output=args.output, max_concurrent=settings.max_concurrent
         )
 
-        json_content = response.choices[0].message.content
-        data = json.loads(json_content)
-
-        candidato_id = id_cv
-        id_cv += 1
-        nombre_completo = data['nombre_completo']
-        logger.info(f'Extracted data for: {nombre_completo}')
-
-        # Candidate general data
-        candidatos_data.append({
-            'candidato_id': candidato_id,
-            'nombre_completo': nombre_completo,
-            'correo': data['correo'],
-            'telefono': data['telefono'],
-            'resumen': data['resumen'],
-            'file_path': file_path
-        })
-
-        # Experience
-        for exp in data.get('experiencia', []):
-            experiencia_data.append({
-                'candidato_id': candidato_id,
-                'nombre_completo': nombre_completo,
-                'empresa': exp['empresa'],
-                'ubicacion': exp['ubicacion'],
-                'puesto': exp['puesto'],
-                'fecha_inicio': exp['fecha_inicio'],
-                'fecha_fin': exp['fecha_fin'],
-                'responsabilidades': ", ".join(exp['responsabilidades']) if exp['responsabilidades'] else None
-            })
-
-        # Education
-        for edu in data.get('educacion', []):
-            educacion_data.append({
-                'candidato_id': candidato_id,
-                'nombre_completo': nombre_completo,
-                'institucion': edu['institucion'],
-                'titulo': edu['titulo'],
-                'fecha_inicio': edu['fecha_inicio'],
-                'fecha_fin': edu['fecha_fin'],
-                'detalles': ", ".join(edu['detalles']) if edu['detalles'] else None
-            })
-
-        # Skills
-        for hab in data.get('habilidades', []):
-            habilidades_data.append({
-                'candidato_id': candidato_id,
-                'nombre_completo': nombre_completo,
-                'nombre': hab['nombre'],
-                'nivel': hab['nivel']
-            })
-
-        # Certifications
-        if data.get('certificaciones'):
-            for cert in data['certificaciones']:
-                certificaciones_data.append({
-                    'candidato_id': candidato_id,
-                    'nombre_completo': nombre_completo,
-                    'certificacion': cert
-                })
-
-        processed.append(file_path)
+    logger.info("Pipeline completed successfully")
+    logger.info("=" * 60)
 
-    except Exception as e:
-        logger.error(f'OpenAI API error for {file_path}: {e}')
-        files_errored += 1
-
-# === SUMMARY ===
-logger.info("-" * 40)
-logger.info(f"Processing summary:")
-logger.info(f"  - Total PDFs found: {len(file_list)}")
-logger.info(f"  - Already processed (skipped): {files_skipped}")
-logger.info(f"  - Newly processed: {len(processed)}")
-logger.info(f"  - Errors: {files_errored}")
-
-# === SAVE TO EXCEL ===
-if not candidatos_data:
-    logger.info("No new candidates to add. Excel file unchanged.")
-else:
-    logger.info(f"Adding {len(candidatos_data)} new candidates to Excel...")
-
-    # Prepare DataFrames
-    candidatos_df_actual = pd.DataFrame(candidatos_data)
-    candidatos_df_actual['zona/area'] = candidatos_df_actual['file_path'].str.split('/', expand=True)[10]
-    candidatos_df_actual = candidatos_df_actual[['candidato_id', 'nombre_completo', 'zona/area', 'correo', 'telefono', 'resumen', 'file_path']]
-
-    # Experience
-    if not experiencia_data:
-        experiencia_df_actual = pd.DataFrame(columns=['candidato_id', 'nombre_completo', 'empresa', 'ubicacion', 'puesto', 'anio_inicio', 'fecha_inicio', 'fecha_fin', 'responsabilidades'])
-    else:
-        experiencia_df_actual = pd.DataFrame(experiencia_data)
-        if 'fecha_inicio' in experiencia_df_actual.columns:
-            experiencia_df_actual['anio_inicio'] = experiencia_df_actual['fecha_inicio'].str.extract(r'(\d{4})')
-        if 'nombre_completo' in experiencia_df_actual.columns:
-            experiencia_df_actual.nombre_completo = experiencia_df_actual.nombre_completo.str.title()
-        experiencia_df_actual = experiencia_df_actual[['candidato_id', 'nombre_completo', 'empresa', 'ubicacion', 'puesto', 'anio_inicio', 'fecha_inicio', 'fecha_fin', 'responsabilidades']]
-
-    # Education
-    if not educacion_data:
-        educacion_df_actual = pd.DataFrame(columns=['candidato_id', 'nombre_completo', 'institucion', 'titulo', 'anio_inicio', 'fecha_inicio', 'fecha_fin', 'detalles'])
-    else:
-        educacion_df_actual = pd.DataFrame(educacion_data)
-        if 'nombre_completo' in educacion_df_actual.columns:
-            educacion_df_actual.nombre_completo = educacion_df_actual.nombre_completo.str.title()
-        if 'fecha_inicio' in educacion_df_actual.columns:
-            educacion_df_actual['anio_inicio'] = educacion_df_actual['fecha_inicio'].str.extract(r'(\d{4})')
-        educacion_df_actual = educacion_df_actual[['candidato_id', 'nombre_completo', 'institucion', 'titulo', 'anio_inicio', 'fecha_inicio', 'fecha_fin', 'detalles']]
-
-    # Skills
-    if not habilidades_data:
-        habilidades_df_actual = pd.DataFrame(columns=['candidato_id', 'nombre_completo', 'nombre', 'nivel'])
-    else:
-        habilidades_df_actual = pd.DataFrame(habilidades_data)
-        if 'nombre_completo' in habilidades_df_actual.columns:
-            habilidades_df_actual.nombre_completo = habilidades_df_actual.nombre_completo.str.title()
 
-    # Certifications
-    if not certificaciones_data:
-        certificaciones_df_actual = pd.DataFrame(columns=['candidato_id', 'nombre_completo', 'certificacion'])
-    else:
-        certificaciones_df_actual = pd.DataFrame(certificaciones_data)
-        if 'nombre_completo' in certificaciones_df_actual.columns:
-            certificaciones_df_actual.nombre_completo = certificaciones_df_actual.nombre_completo.str.title()
+def process_files(file_list, excel_path, runs_dir, aclient, client, executor,
+                  mode='sync', output='excel', max_concurrent=20):
+    """Extract the new CVs among file_list, (path, size) pairs, and append them to the output.
 
-    # Write to Excel
-    from openpyxl import load_workbook
-    from openpyxl.styles import Font
-    from openpyxl.utils import get_column_letter
+    executor is a Docling worker pool (initialized with init_converter). Exits the
+    process on unrecoverable errors, as main() does.
+    """
+    # === LOAD EXISTING EXCEL DATA ===
+    expected_sheets = ['Candidatos', 'Experiencia', 'Educacion', 'Habilidades', 'Certificaciones']
 
+    candidato_ids = []
+
+    # Only the candidato_id column is read (streaming, read-only) to find the next id
     try:
-        with pd.ExcelWriter(excel_path, engine='openpyxl', mode='a', if_sheet_exists='overlay') as writer:
-            existing_data = pd.read_excel(excel_path, sheet_name=None)
-
-            if not candidatos_df_actual.empty:
-                start_row = len(existing_data['Candidatos']) + 1
-                candidatos_df_actual.to_excel(writer, sheet_name='Candidatos', startrow=start_row, index=False, header=False)
-
-            if not experiencia_df_actual.empty:
-                start_row = len(existing_data['Experiencia']) + 1
-                experiencia_df_actual.to_excel(writer, sheet_name='Experiencia', startrow=start_row, index=False, header=False)
-
-            if not educacion_df_actual.empty:
-                start_row = len(existing_data['Educacion']) + 1
-                educacion_df_actual.to_excel(writer, sheet_name='Educacion', startrow=start_row, index=False, header=False)
-
-            if not habilidades_df_actual.empty:
-                start_row = len(existing_data['Habilidades']) + 1
-                habilidades_df_actual.to_excel(writer, sheet_name='Habilidades', startrow=start_row, index=False, header=False)
-
-            if not certificaciones_df_actual.empty:
-                start_row = len(existing_data['Certificaciones']) + 1
-                certificaciones_df_actual.to_excel(writer, sheet_name='Certificaciones', startrow=start_row, index=False, header=False)
-
-        # Apply formatting
-        workbook = load_workbook(excel_path)
-        bold_font = Font(bold=True)
-
-        for sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-            sheet.freeze_panes = 'C2'
-
-            for cell in sheet[1]:
-                cell.font = bold_font
-
-            for col_idx, col in enumerate(sheet.columns, 1):
-                max_length = 0
-                for cell in col:
-                    try:
-                        if cell.value:
-                            max_length = max(max_length, len(str(cell.value)))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)  # Cap width at 50
-                sheet.column_dimensions[get_column_letter(col_idx)].width = adjusted_width
-
-        workbook.save(excel_path)
-        logger.info(f"Excel file updated successfully: {excel_path}")
-
-    except PermissionError:
-        logger.error(f"Cannot write to Excel file - it may be open in another application: {excel_path}")
-        sys.exit(1)
+        if not os.path.exists(excel_path):
+            # Created when the new rows are saved, with ids starting at 1
+            logger.info(f"Excel file not found, it will be created: {excel_path}")
+        elif (stats := read_workbook_stats(excel_path)) is not None:
+            # Counts saved with the workbook by the last run; only the last id is needed
+            candidato_ids = [stats['max_candidato_id']]
+            logger.info(f"Loaded cached counts: {stats['rows']['Candidatos'] - 1} existing candidates")
+        else:
+            workbook = load_workbook(excel_path, read_only=True)
+            try:
+                for sheet in expected_sheets:
+                    if sheet not in workbook.sheetnames:
+                        logger.warning(f'Sheet "{sheet}" is not present in the file.')
+
+                # A missing or header-only Candidatos sheet gives 0: ids start at 1, and
+                # append_to_workbook creates or fills the sheet
+                last_id = max_candidato_id(workbook)
+            finally:
+                workbook.close()
+
+            candidato_ids = [last_id]
+            logger.info(f"Loaded Excel file, last candidato_id: {last_id}")
+
+        # Runs written as Parquet but not merged yet already hold ids beyond the workbook's
+        run_dirs = pending_runs(runs_dir)
+        if run_dirs:
+            run_ids = read_runs(run_dirs, 'Candidatos', columns=['candidato_id'])['candidato_id']
+            candidato_ids.extend(run_ids.tolist())
+            logger.info(f"Found {len(run_dirs)} unmerged Parquet runs with {len(run_ids)} candidates")
+
     except Exception as e:
-        logger.error(f"Error writing to Excel file: {e}")
+        logger.error(f"Error reading Excel file: {e}")
         sys.exit(1)
 
-logger.info("Pipeline completed successfully")
-logger.info("=" * 60)
+    # === PROCESS PDFs ===
+    processed = []
+    id_cv = max(candidato_ids, default=0) + 1
+
+    # Column lists for each DataFrame (derived columns are added when the frames are built)
+    candidatos_data = {column: [] for column in ('candidato_id', 'nombre_completo', 'correo', 'telefono', 'resumen', 'file_path')}
+    experiencia_data = {column: [] for column in ('candidato_id', 'empresa', 'ubicacion', 'puesto', 'fecha_inicio', 'fecha_fin', 'responsabilidades')}
+    educacion_data = {column: [] for column in ('candidato_id', 'institucion', 'titulo', 'fecha_inicio', 'fecha_fin', 'detalles')}
+    habilidades_data = {column: [] for column in ('candidato_id', 'nombre', 'nivel')}
+    certificaciones_data = {column: [] for column in ('candidato_id', 'certificacion')}
+
+    # Count files to process
+    files_to_process = 0
+    files_skipped = 0
+    files_errored = 0
+
+    # Largest files first, so long Docling conversions start early instead of straggling at the end
+    pdfs = sorted(
+        ((file_path, size) for file_path, size in file_list if file_path.lower().endswith('.pdf')),
+        key=lambda pdf: pdf[1],
+        reverse=True
+    )
+    candidates = [file_path for file_path, _ in pdfs]
+
+    existing_hashes = load_existing_hashes()
+    legacy_hashes = {h for h in existing_hashes if not h.startswith(HASH_PREFIX)}
+
+    def hash_candidate(file_path):
+        file_hash = calculate_file_hash(file_path)
+        # Only files without a BLAKE3 entry can be recorded under their legacy SHA-256 hash
+        if legacy_hashes and file_hash not in existing_hashes:
+            return file_hash, calculate_legacy_file_hash(file_path)
+        return file_hash, None
+
+    # Pass 1: hash every candidate up front, so Docling and OpenAI only see new files.
+    # Threads suffice: hashing is I/O-bound and blake3/hashlib release the GIL on large updates.
+    with ThreadPoolExecutor() as hash_pool:
+        file_hashes = list(tqdm(
+            hash_pool.map(hash_candidate, candidates),
+            total=len(candidates),
+            desc="Hashing PDFs"
+        ))
+
+    # The skip decision runs serially so duplicates within this run are caught too
+    to_convert = []
+
+    with open(HASHES_FILE, "a") as hashes_file:
+        for file_path, (file_hash, legacy_hash) in zip(candidates, file_hashes):
+            if not process_pdf(
+                file_path, file_hash, existing_hashes, hashes_file, legacy_hashes, legacy_hash, force=False
+            ):
+                files_skipped += 1
+                continue
+
+            files_to_process += 1
+            to_convert.append((file_path, file_hash))
+
+    logger.info(f"{files_to_process} new files to process")
+
+    # A batch left by an interrupted run is resumed rather than converted and paid for again;
+    # new files it does not cover wait for the next run
+    batch_id = None
+    if mode == 'batch' and (saved_batch := load_batch_state()) is not None:
+        saved_ids = set(saved_batch['custom_ids'])
+        resumed = [(file_path, file_hash) for file_path, file_hash in to_convert if file_hash in saved_ids]
+        if resumed:
+            batch_id = saved_batch['batch_id']
+            logger.info(
+                f"Resuming batch {batch_id} with {len(resumed)} files; "
+                f"{len(to_convert) - len(resumed)} other new files wait for the next run"
+            )
+            to_convert = resumed
+        else:
+            logger.info(f"Discarding saved batch {saved_batch['batch_id']}: its files are already processed")
+            clear_batch_state()
+
+    # Pass 2: convert (Docling, one DocumentConverter per worker process) and extract (OpenAI).
+    # Results line up with to_convert: a Curriculum, or the exception already logged for that file.
+    results = []
+
+    if to_convert:
+        if mode == 'batch':
+            if batch_id is not None:
+                # Resumed: every file is in the saved batch, nothing to convert
+                results = [None] * len(to_convert)
+            else:
+                # The batch file needs every markdown up front, so convert everything first,
+                # a chunk of files per convert_all() call
+                chunks = [
+                    to_convert[start:start + CONVERT_CHUNK_SIZE]
+                    for start in range(0, len(to_convert), CONVERT_CHUNK_SIZE)
+                ]
+                futures = [
+                    executor.submit(convert_many_to_md, [file_path for file_path, _ in chunk])
+                    for chunk in chunks
+                ]
+                pending = []
+
+                with tqdm(total=len(to_convert), desc="Converting CVs") as pbar:
+                    for chunk, future in zip(chunks, futures):
+                        try:
+                            markdowns = future.result()
+                        except Exception as e:
+                            markdowns = [e] * len(chunk)
+
+                        for (file_path, file_hash), result_text in zip(chunk, markdowns):
+                            if isinstance(result_text, Exception):
+                                logger.error(f'Docling error for {file_path}: {result_text}')
+                                results.append(result_text)
+                            else:
+                                pending.append((file_path, file_hash, result_text))
+                                results.append(None)
+
+                        pbar.update(len(chunk))
+
+            # Entries without a result yet are the ones in the batch
+            submitted = [entry for entry, result in zip(to_convert, results) if result is None]
+            try:
+                if submitted and batch_id is None:
+                    batch_id = submit_batch(client, pending)
+                extracted = iter(run_batch(client, batch_id, submitted) if submitted else [])
+            except Exception as e:
+                if batch_id is None:
+                    logger.error(f"Error submitting the batch: {e}")
+                else:
+                    logger.error(f"Error waiting for batch {batch_id} (the next --mode batch run resumes it): {e}")
+                sys.exit(1)
+            results = [result if isinstance(result, Exception) else next(extracted) for result in results]
+        else:
+            results = asyncio.run(run_pipeline(aclient, executor, to_convert, max_concurrent))
+
+    # Candidate ids are assigned in processing (size) order, after all files are done
+    for (file_path, file_hash), cv in zip(to_convert, results):
+        if isinstance(cv, Exception):
+            files_errored += 1
+            continue
+
+        try:
+            candidato_id = id_cv
+            id_cv += 1
+            nombre_completo = cv.nombre_completo
+            logger.info(f'Extracted data for: {nombre_completo}')
+
+            # Candidate general data
+            append_row(
+                candidatos_data,
+                candidato_id=candidato_id,
+                nombre_completo=nombre_completo,
+                correo=cv.correo,
+                telefono=cv.telefono,
+                resumen=cv.resumen,
+                file_path=file_path
+            )
+
+            # Experience
+            for exp in cv.experiencia:
+                append_row(
+                    experiencia_data,
+                    candidato_id=candidato_id,
+                    empresa=exp.empresa,
+                    ubicacion=exp.ubicacion,
+                    puesto=exp.puesto,
+                    fecha_inicio=exp.fecha_inicio,
+                    fecha_fin=exp.fecha_fin,
+                    responsabilidades=", ".join(exp.responsabilidades) if exp.responsabilidades else None
+                )
+
+            # Education
+            for edu in cv.educacion or []:
+                append_row(
+                    educacion_data,
+                    candidato_id=candidato_id,
+                    institucion=edu.institucion,
+                    titulo=edu.titulo,
+                    fecha_inicio=edu.fecha_inicio,
+                    fecha_fin=edu.fecha_fin,
+                    detalles=", ".join(edu.detalles) if edu.detalles else None
+                )
+
+            # Skills
+            for hab in cv.habilidades or []:
+                append_row(habilidades_data, candidato_id=candidato_id, nombre=hab.nombre, nivel=hab.nivel)
+
+            # Certifications
+            for cert in cv.certificaciones or []:
+                append_row(certificaciones_data, candidato_id=candidato_id, certificacion=cert)
+
+            processed.append((file_path, file_hash))
+
+        except Exception as e:
+            logger.error(f'Error processing extracted data for {file_path}: {e}')
+            files_errored += 1
+
+    # === SUMMARY ===
+    logger.info("-" * 40)
+    logger.info(f"Processing summary:")
+    logger.info(f"  - Total PDFs found: {len(file_list)}")
+    logger.info(f"  - Already processed (skipped): {files_skipped}")
+    logger.info(f"  - Newly processed: {len(processed)}")
+    logger.info(f"  - Errors: {files_errored}")
+
+    # === SAVE TO EXCEL ===
+    if not candidatos_data['candidato_id']:
+        logger.info("No new candidates to add. Excel file unchanged.")
+    else:
+        logger.info(f"Adding {len(candidatos_data['candidato_id'])} new candidates ({output})...")
+
+        # Prepare DataFrames straight from the column lists, already in sheet column order
+        # (derived columns, and the candidate name on child sheets, start empty and are filled below).
+        # Child sheets without new rows get no DataFrame at all.
+        def build_df(data, columns):
+            return pd.DataFrame(data, columns=columns, copy=False) if data['candidato_id'] else None
+
+        candidatos_df_actual = build_df(candidatos_data, CANDIDATOS_COLUMNS)
+        experiencia_df_actual = build_df(experiencia_data, EXPERIENCIA_COLUMNS)
+        educacion_df_actual = build_df(educacion_data, EDUCACION_COLUMNS)
+        habilidades_df_actual = build_df(habilidades_data, HABILIDADES_COLUMNS)
+        certificaciones_df_actual = build_df(certificaciones_data, CERTIFICACIONES_COLUMNS)
+
+        # Zone/area is the 11th path component; maxsplit stops scanning right after it.
+        # It and the skill level repeat a handful of values, so they are stored as categoricals.
+        candidatos_df_actual['zona/area'] = pd.Categorical([
+            file_path.split('/', 11)[10] if file_path.count('/') >= 10 else None
+            for file_path in candidatos_df_actual['file_path']
+        ])
+        if habilidades_df_actual is not None:
+            habilidades_df_actual['nivel'] = habilidades_df_actual['nivel'].astype('category')
+
+        search_year = YEAR_RE.search
+        for df in (experiencia_df_actual, educacion_df_actual):
+            if df is None:
+                continue
+            df['anio_inicio'] = [
+                match.group(1) if isinstance(value, str) and (match := search_year(value)) else None
+                for value in df['fecha_inicio']
+            ]
+
+        # Child rows only carry candidato_id; the title-cased name is joined in once per sheet
+        # (title-cased by Arrow's UTF-8 kernel rather than per element in Python)
+        nombres = (
+            candidatos_df_actual.set_index('candidato_id')['nombre_completo']
+            .astype('string[pyarrow]')
+            .str.title()
+        )
+        for df in (experiencia_df_actual, educacion_df_actual, habilidades_df_actual, certificaciones_df_actual):
+            if df is not None:
+                df['nombre_completo'] = df['candidato_id'].map(nombres)
+
+        frames = {
+            sheet_name: df
+            for sheet_name, df in (
+                ('Candidatos', candidatos_df_actual),
+                ('Experiencia', experiencia_df_actual),
+                ('Educacion', educacion_df_actual),
+                ('Habilidades', habilidades_df_actual),
+                ('Certificaciones', certificaciones_df_actual),
+            )
+            if df is not None
+        }
+
+        if output == 'parquet':
+            try:
+                run_dir = write_run(runs_dir, frames)
+                logger.info(f"Run written to {run_dir}; merge it with rebuild_xlsx.py")
+
+            except Exception as e:
+                logger.error(f"Error writing Parquet run to {runs_dir}: {e}")
+                sys.exit(1)
+        else:
+            # Write to Excel: open the workbook once, append rows, format and save
+            try:
+                append_to_workbook(excel_path, frames)
+                logger.info(f"Excel file updated successfully: {excel_path}")
+
+            except PermissionError:
+                logger.error(f"Cannot write to Excel file - it may be open in another application: {excel_path}")
+                sys.exit(1)
+            except Exception as e:
+                logger.error(f"Error writing to Excel file: {e}")
+                sys.exit(1)
+
+        # Hashes are only recorded once the rows are saved, so files from a failed
+        # conversion, batch or write are picked up again by the next run
+        with open(HASHES_FILE, "a") as hashes_file:
+            for _, file_hash in processed:
+                save_hash(file_hash, hashes_file)
+
+    # The batch's results are written (or it ended without any), so there is nothing to resume
+    if batch_id is not None:
+        clear_batch_state()
+
+
+if __name__ == "__main__":
+    main()
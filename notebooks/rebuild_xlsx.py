@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+CV Workbook Merge
+Appends the Parquet runs written by `extract_cv_data.py --output parquet` to the
+Excel workbook in a single pass, then moves them to the runs' merged/ directory.
+
+Meant to run nightly via cronjob, after the day's extraction runs. All paths are
+absolute to ensure consistent behavior regardless of working directory.
+"""
+
+import sys
+import logging
+from pathlib import Path
+from datetime import datetime
+
+# === SETUP ABSOLUTE PATHS ===
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+LOG_DIR = PROJECT_ROOT / "logs"
+
+# Add project root to path for imports
+sys.path.insert(0, str(PROJECT_ROOT))
+
+logger = logging.getLogger(__name__)
+
+# === IMPORTS ===
+from dotenv import load_dotenv
+
+from src.cv_folder import load_settings
+from src.cv_storage import (
+    SHEET_COLUMNS,
+    append_to_workbook,
+    mark_merged,
+    pending_runs,
+    read_runs,
+)
+
+
+def main():
+    # === LOGGING SETUP ===
+    LOG_DIR.mkdir(exist_ok=True)
+
+    log_filename = LOG_DIR / f"rebuild_xlsx_{datetime.now().strftime('%Y%m%d')}.log"
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_filename),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    logger.info("=" * 60)
+    logger.info("Starting CV workbook merge")
+
+    # === LOAD ENVIRONMENT ===
+    env_path = PROJECT_ROOT / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+        logger.info(f"Loaded environment from: {env_path}")
+    else:
+        logger.warning(f".env file not found at: {env_path}")
+
+    # === CONFIGURATION ===
+    settings = load_settings()
+    runs_dir = settings.runs_dir
+    excel_path = settings.excel_path
+
+    logger.info(f"Runs directory: {runs_dir}")
+    logger.info(f"Output file: {excel_path}")
+
+    # === MERGE RUNS ===
+    run_dirs = pending_runs(runs_dir)
+    if not run_dirs:
+        logger.info("No unmerged runs. Excel file unchanged.")
+        sys.exit(0)
+
+    logger.info(f"Merging {len(run_dirs)} runs: {', '.join(run_dir.name for run_dir in run_dirs)}")
+
+    try:
+        frames = {
+            sheet_name: df
+            for sheet_name in SHEET_COLUMNS
+            if (df := read_runs(run_dirs, sheet_name)) is not None
+        }
+        append_to_workbook(excel_path, frames)
+        logger.info(f"Added {len(frames['Candidatos'])} candidates to {excel_path}")
+
+    except PermissionError:
+        logger.error(f"Cannot write to Excel file - it may be open in another application: {excel_path}")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"Error merging runs into Excel file: {e}")
+        sys.exit(1)
+
+    mark_merged(runs_dir, run_dirs)
+
+    logger.info("Merge completed successfully")
+    logger.info("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
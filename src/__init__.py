@@ -1 +0,0 @@
-from src import config  # noqa: F401
@@ -0,0 +1,80 @@
+"""Where the CVs and the extracted data live, the CV_* settings, and discovery of the CV PDFs.
+
+Standard library only, so that `cv_worker.py submit` (run by cron) can walk the CV
+folder without importing pandas, openpyxl or the project config.
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Default location of the CV folder; the workbook lives at its root
+DEFAULT_ROOT_DIR = os.path.join(
+    os.path.expanduser("~"),
+    "Library",
+    "CloudStorage",
+    "OneDrive-ESPARTINAS.A",
+    "DocumentacionEspartina",
+    "INNOVACION",
+    "Desarrollos propios",
+    "Base Datos CV Capital Humano",
+)
+DEFAULT_OUTPUT_NAME = "base_cv_capital_humano.xlsx"
+
+# Per-run Parquet output (config.PROCESSED_DATA_DIR / "cv_runs", without importing config)
+DEFAULT_RUNS_DIR = Path(__file__).resolve().parents[1] / "data" / "processed" / "cv_runs"
+
+
+class Settings(NamedTuple):
+    """Pipeline settings read from the CV_* environment variables."""
+
+    root_dir: str
+    excel_path: str
+    runs_dir: str
+    max_concurrent: int
+    docling_workers: int
+
+
+def load_settings():
+    """Read the CV_* environment variables (load .env first), falling back to the defaults."""
+    root_dir = os.getenv("CV_ROOT_DIR", DEFAULT_ROOT_DIR)
+
+    return Settings(
+        root_dir=root_dir,
+        excel_path=os.path.join(root_dir, os.getenv("CV_OUTPUT_NAME", DEFAULT_OUTPUT_NAME)),
+        runs_dir=os.getenv("CV_RUNS_DIR", str(DEFAULT_RUNS_DIR)),
+        # Maximum number of OpenAI requests in flight at once
+        max_concurrent=int(os.getenv("CV_MAX_CONCURRENT", "20")),
+        # Number of Docling worker processes (each loads its own models)
+        docling_workers=int(os.getenv("CV_DOCLING_WORKERS", min(4, os.cpu_count() or 1))),
+    )
+
+
+def iter_pdfs(root_dir):
+    """Yield (path, size in bytes) for every PDF below root_dir.
+
+    Walks with os.scandir so each file costs a single stat (the directory entries already
+    say what is a file or a folder), which matters on cloud-synced folders with slow stats.
+    Folders and files that cannot be read are logged and skipped, as os.walk would.
+    """
+    stack = [root_dir]
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as folder_entries:
+                entries = list(folder_entries)
+        except OSError as e:
+            logger.warning(f"Skipping unreadable folder {folder}: {e}")
+            continue
+
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file() and entry.name.lower().endswith(".pdf"):
+                    yield entry.path, entry.stat().st_size
+            except OSError as e:
+                logger.warning(f"Skipping unreadable entry {entry.path}: {e}")
@@ -0,0 +1,372 @@
+"""Storage for extracted CV data: the Excel workbook and per-run Parquet files.
+
+`extract_cv_data.py` either appends each run straight to the workbook or, with
+`--output parquet`, writes the run as Parquet files that `rebuild_xlsx.py` later
+merges into the workbook in a single pass.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.dataset as ds
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, NamedStyle
+from openpyxl.utils import get_column_letter
+from pandas.api.types import is_string_dtype
+
+# Merged Parquet runs are moved to RUNS_DIR / MERGED_DIRNAME
+MERGED_DIRNAME = "merged"
+
+# Named style of the header row
+HEADER_STYLE = "header"
+
+# Column order of each sheet
+CANDIDATOS_COLUMNS = [
+    "candidato_id",
+    "nombre_completo",
+    "zona/area",
+    "correo",
+    "telefono",
+    "resumen",
+    "file_path",
+]
+EXPERIENCIA_COLUMNS = [
+    "candidato_id",
+    "nombre_completo",
+    "empresa",
+    "ubicacion",
+    "puesto",
+    "anio_inicio",
+    "fecha_inicio",
+    "fecha_fin",
+    "responsabilidades",
+]
+EDUCACION_COLUMNS = [
+    "candidato_id",
+    "nombre_completo",
+    "institucion",
+    "titulo",
+    "anio_inicio",
+    "fecha_inicio",
+    "fecha_fin",
+    "detalles",
+]
+HABILIDADES_COLUMNS = ["candidato_id", "nombre_completo", "nombre", "nivel"]
+CERTIFICACIONES_COLUMNS = ["candidato_id", "nombre_completo", "certificacion"]
+
+SHEET_COLUMNS = {
+    "Candidatos": CANDIDATOS_COLUMNS,
+    "Experiencia": EXPERIENCIA_COLUMNS,
+    "Educacion": EDUCACION_COLUMNS,
+    "Habilidades": HABILIDADES_COLUMNS,
+    "Certificaciones": CERTIFICACIONES_COLUMNS,
+}
+
+
+# === EXCEL ===
+def save_workbook(workbook, excel_path):
+    """Save the workbook to a temporary file beside excel_path, then swap it in.
+
+    A failed or interrupted save leaves the previous workbook intact instead of a
+    truncated file, and openpyxl never writes over the file it was loaded from.
+    """
+    tmp_path = f"{excel_path}.tmp"
+    try:
+        workbook.save(tmp_path)
+        with open(tmp_path, "rb") as tmp_file:
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, excel_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def stats_path(excel_path):
+    """Path of the JSON file caching the workbook's row counts, kept beside it."""
+    return f"{excel_path}.rowcounts.json"
+
+
+def write_workbook_stats(excel_path, rows, max_candidato_id):
+    """Record each sheet's row count (header included) and the last candidato_id just saved.
+
+    The workbook's mtime and size are stored too, so the counts are only trusted while
+    the file is exactly as this process left it.
+    """
+    stat = os.stat(excel_path)
+    stats = {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "rows": rows,
+        "max_candidato_id": max_candidato_id,
+    }
+
+    tmp_path = f"{stats_path(excel_path)}.tmp"
+    with open(tmp_path, "w") as stats_file:
+        json.dump(stats, stats_file)
+    os.replace(tmp_path, stats_path(excel_path))
+
+
+def read_workbook_stats(excel_path):
+    """Cached row counts for the workbook, or None if missing, incomplete or stale (edited since)."""
+    try:
+        with open(stats_path(excel_path)) as stats_file:
+            stats = json.load(stats_file)
+        stat = os.stat(excel_path)
+    except (OSError, ValueError):
+        return None
+
+    # A file written by another version, or edited by hand, may lack some of the keys
+    if not (
+        isinstance(stats, dict)
+        and isinstance(stats.get("rows"), dict)
+        and "Candidatos" in stats["rows"]
+        and isinstance(stats.get("max_candidato_id"), int)
+    ):
+        return None
+    if (stats.get("mtime_ns"), stats.get("size")) != (stat.st_mtime_ns, stat.st_size):
+        return None
+    return stats
+
+
+def add_header_style(workbook):
+    """Register the bold header named style in the workbook (once) and return its name.
+
+    Header cells share this one style entry instead of each getting its own font.
+    """
+    if HEADER_STYLE not in workbook.named_styles:
+        workbook.add_named_style(NamedStyle(name=HEADER_STYLE, font=Font(bold=True)))
+    return HEADER_STYLE
+
+
+def append_df_rows(sheet, df):
+    """Append a DataFrame's rows to a sheet (regular or write-only), below its last row."""
+    # Missing values become empty cells, as with DataFrame.to_excel
+    df = df.astype(object).where(df.notna(), None)
+    append = sheet.append  # bound once for the row loop
+    for row in df.itertuples(index=False, name=None):
+        append(row)
+
+
+def append_rows(workbook, sheet_name, df):
+    """Append DataFrame rows below the last row of a sheet, creating it (with header) if missing.
+
+    A new sheet gets its formatting (bold header, header row and id columns frozen) when
+    it is created; existing sheets already carry it.
+    """
+    if sheet_name in workbook.sheetnames:
+        sheet = workbook[sheet_name]
+    else:
+        sheet = workbook.create_sheet(sheet_name)
+        sheet.freeze_panes = "C2"
+        sheet.append(list(df.columns))
+
+        header_style = add_header_style(workbook)
+        for cell in sheet[1]:
+            cell.style = header_style
+
+    append_df_rows(sheet, df)
+
+
+def column_widths(df):
+    """Column widths fitting a DataFrame's header and values, capped at 50."""
+    widths = []
+    for column in df.columns:
+        values = df[column].dropna()
+        # Strings are measured as they are; only other values are converted with str().
+        # Categoricals only need their distinct values measured.
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.cat.categories.to_series()
+        lengths = values.str.len() if is_string_dtype(values) else values.astype(str).str.len()
+        max_length = max(len(column), int(lengths.max()) if len(values) else 0)
+        widths.append(min(max_length + 2, 50))  # Cap width at 50
+    return widths
+
+
+def fit_column_widths(workbook, frames):
+    """Widen each sheet's columns to fit the rows just appended from `frames`.
+
+    Widths only ever grow: a column keeps its current width unless the new rows need
+    more, so existing cells are never re-measured.
+    """
+
+    for sheet_name, df in frames.items():
+        sheet = workbook[sheet_name]
+        for col_idx, width in enumerate(column_widths(df), 1):
+            dimension = sheet.column_dimensions[get_column_letter(col_idx)]
+            dimension.width = max(dimension.width or 0, width)
+
+
+def max_candidato_id(workbook):
+    """Largest candidato_id in a loaded workbook's Candidatos sheet, or 0 if it has none."""
+    if "Candidatos" not in workbook.sheetnames:
+        return 0
+
+    sheet = workbook["Candidatos"]
+    header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+    if "candidato_id" not in header:
+        return 0
+
+    id_col = header.index("candidato_id") + 1
+    ids = sheet.iter_rows(min_row=2, min_col=id_col, max_col=id_col, values_only=True)
+    return max((int(value) for (value,) in ids if isinstance(value, (int, float))), default=0)
+
+
+def update_workbook_stats(excel_path, rows, frames, previous_max_id):
+    """Refresh the cached row counts after a save.
+
+    The last id is the larger of the workbook's before this save (`previous_max_id`) and
+    this save's: merged Parquet runs can add ids below ones already in the workbook.
+    Without any candidates the cache is dropped.
+    """
+    max_id = previous_max_id
+    if "Candidatos" in frames and not frames["Candidatos"].empty:
+        max_id = max(max_id, int(frames["Candidatos"]["candidato_id"].max()))
+
+    if max_id:
+        write_workbook_stats(excel_path, rows, max_id)
+    elif os.path.exists(stats_path(excel_path)):
+        os.remove(stats_path(excel_path))
+
+
+def write_new_workbook(excel_path, frames):
+    """Create the workbook from scratch in write-only mode, streaming rows straight to disk.
+
+    Every sheet is created, with just its header if it has no rows in `frames`. The
+    formatting (bold header, frozen panes, column widths) is set as each sheet is created,
+    since write-only sheets can't be changed once rows are written.
+    """
+    workbook = Workbook(write_only=True)
+    header_style = add_header_style(workbook)
+    rows = {}
+
+    for sheet_name, columns in SHEET_COLUMNS.items():
+        df = frames.get(sheet_name)
+        if df is None:
+            df = pd.DataFrame(columns=columns)
+
+        sheet = workbook.create_sheet(sheet_name)
+        sheet.freeze_panes = "C2"
+
+        for col_idx, width in enumerate(column_widths(df), 1):
+            sheet.column_dimensions[get_column_letter(col_idx)].width = width
+
+        header = []
+        for column in df.columns:
+            cell = WriteOnlyCell(sheet, value=column)
+            cell.style = header_style
+            header.append(cell)
+        sheet.append(header)
+        append_df_rows(sheet, df)
+
+        rows[sheet_name] = len(df) + 1
+
+    save_workbook(workbook, excel_path)
+    update_workbook_stats(excel_path, rows, frames, 0)
+
+
+def append_to_workbook(excel_path, frames):
+    """Append each sheet's new rows to the workbook, fit column widths and save, opening it once.
+
+    `frames` maps sheet names to DataFrames in the sheet's column order; sheets without
+    new rows may be left out. A missing workbook is created with write_new_workbook.
+    """
+    if not os.path.exists(excel_path):
+        write_new_workbook(excel_path, frames)
+        return
+
+    # The last id saved so far: cached while the workbook is unchanged, otherwise scanned
+    stats = read_workbook_stats(excel_path)
+    workbook = load_workbook(excel_path)
+    previous_max_id = stats["max_candidato_id"] if stats else max_candidato_id(workbook)
+
+    for sheet_name, df in frames.items():
+        append_rows(workbook, sheet_name, df)
+
+    fit_column_widths(workbook, frames)
+    rows = {sheet_name: workbook[sheet_name].max_row for sheet_name in workbook.sheetnames}
+    save_workbook(workbook, excel_path)
+    update_workbook_stats(excel_path, rows, frames, previous_max_id)
+
+
+# === PARQUET RUNS ===
+def run_file(run_dir, sheet_name):
+    """Path of one sheet's Parquet file within a run directory."""
+    return Path(run_dir) / f"{sheet_name.lower()}.parquet"
+
+
+def write_run(runs_dir, frames):
+    """Write one run's sheets as zstd-compressed Parquet files in a new timestamped directory.
+
+    Only the sheets in `frames` get a file.
+
+    Types are pinned (integer ids, string everything else) so that runs with empty or
+    all-null columns still share one schema. The files are written to a hidden temporary
+    directory that is renamed into place once complete, so pending_runs never sees a
+    partial run. Returns the run directory.
+    """
+    runs_dir = Path(runs_dir)
+    runs_dir.mkdir(parents=True, exist_ok=True)
+
+    # Microseconds and the process id keep runs started in the same second apart
+    name = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{os.getpid()}"
+    tmp_dir = runs_dir / f".{name}.tmp"
+    tmp_dir.mkdir()
+    try:
+        for sheet_name, df in frames.items():
+            dtypes = {
+                column: "int64" if column == "candidato_id" else "string" for column in df.columns
+            }
+            df.astype(dtypes).to_parquet(
+                run_file(tmp_dir, sheet_name), engine="pyarrow", compression="zstd", index=False
+            )
+
+        run_dir = runs_dir / name
+        os.rename(tmp_dir, run_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    return run_dir
+
+
+def pending_runs(runs_dir):
+    """Run directories not yet merged into the workbook, oldest first.
+
+    Hidden directories (runs still being written) are skipped.
+    """
+    runs_dir = Path(runs_dir)
+    if not runs_dir.exists():
+        return []
+
+    return sorted(
+        path
+        for path in runs_dir.iterdir()
+        if path.is_dir() and path.name != MERGED_DIRNAME and not path.name.startswith(".")
+    )
+
+
+def read_runs(run_dirs, sheet_name, columns=None):
+    """Read and concatenate one sheet across run directories, in run order.
+
+    Returns None if none of the runs has rows for the sheet.
+    """
+    paths = [run_file(run_dir, sheet_name) for run_dir in run_dirs]
+    paths = [str(path) for path in paths if path.exists()]
+    if not paths:
+        return None
+
+    return ds.dataset(paths, format="parquet").to_table(columns=columns).to_pandas()
+
+
+def mark_merged(runs_dir, run_dirs):
+    """Move run directories into the merged/ subdirectory once they are in the workbook."""
+    merged_dir = Path(runs_dir) / MERGED_DIRNAME
+    merged_dir.mkdir(parents=True, exist_ok=True)
+
+    for run_dir in run_dirs:
+        shutil.move(str(run_dir), str(merged_dir / Path(run_dir).name))